@@ -29,6 +29,13 @@ def get_supabase_client():
     return create_client(supabase_url, supabase_key)
 
 
+def upsert_in_batches(supabase, table, rows, on_conflict=None, batch_size=1000):
+    """分批 upsert，每批一次请求，避免单个请求体过大"""
+    kwargs = {"on_conflict": on_conflict} if on_conflict else {}
+    for i in range(0, len(rows), batch_size):
+        supabase.table(table).upsert(rows[i:i + batch_size], **kwargs).execute()
+
+
 async def update_data():
     # Part 1: Fetch data from official FPL API
     logger.info(f"[{datetime.now()}] Fetching data from FPL API...")
@@ -149,7 +156,7 @@ async def update_data():
 
     # Upsert players in batches
     if players_to_upsert:
-        supabase.table("players").upsert(players_to_upsert).execute()
+        upsert_in_batches(supabase, "players", players_to_upsert)
     
     # Merge DGW (Double Gameweek) data - sum up stats for same player in same round
     from collections import defaultdict
@@ -199,7 +206,7 @@ async def update_data():
     
     # Insert history in batches
     if history_to_insert:
-        supabase.table("player_history").upsert(history_to_insert, on_conflict="player_id,round").execute()
+        upsert_in_batches(supabase, "player_history", history_to_insert, on_conflict="player_id,round")
     
     # 创建轮次与赛程的映射
     fixtures_by_team_gw = {}
@@ -238,11 +245,7 @@ async def update_data():
         
         if predictions:
             logger.info(f"[{datetime.now()}] Saving {len(predictions)} predictions to Supabase...")
-            # Upsert in batches of 1000
-            batch_size = 1000
-            for i in range(0, len(predictions), batch_size):
-                batch = predictions[i:i + batch_size]
-                supabase.table("predictions").upsert(batch, on_conflict="player_id,gw").execute()
+            upsert_in_batches(supabase, "predictions", predictions, on_conflict="player_id,gw")
             logger.info(f"[{datetime.now()}] Predictions saved.")
         else:
             logger.info("No predictions generated.")
@@ -345,31 +348,28 @@ def query_player_by_name(name):
             logger.info(f"{key}: {value}")
 
         # Get player history
-        history_result = supabase.table("player_history").select("round, opponent_team_id, was_home, total_points").eq("player_id", player_id).order("round").execute()
+        # 对手球队名通过 PostgREST 关联查询一次取回，避免每行再查一次 teams
+        history_result = supabase.table("player_history").select("round, was_home, total_points, opponent_team:teams(short_name)").eq("player_id", player_id).order("round").execute()
         history = history_result.data
         
         if history:
             logger.info("\nMatch History (Actual Points):")
             logger.info(f"{'Gameweek':<10} {'Opponent':<10} {'Venue':<10} {'Points':<10}")
             for item in history:
-                # Get opponent team name
-                team_result = supabase.table("teams").select("short_name").eq("team_id", item['opponent_team_id']).execute()
-                opponent = team_result.data[0]['short_name'] if team_result.data else "Unknown"
+                opponent = item['opponent_team'].get('short_name', 'Unknown') if isinstance(item.get('opponent_team'), dict) else "Unknown"
                 
                 venue = "Home" if item['was_home'] else "Away"
                 logger.info(f"{item['round']:<10} {opponent:<10} {venue:<10} {item['total_points']:<10}")
 
         # Get predictions
-        predictions_result = supabase.table("predictions").select("gw, predicted_pts, opponent_team_id, is_home, difficulty").eq("player_id", player_id).order("gw").execute()
+        predictions_result = supabase.table("predictions").select("gw, predicted_pts, is_home, difficulty, opponent_team:teams(short_name)").eq("player_id", player_id).order("gw").execute()
         predictions = predictions_result.data
         
         if predictions:
             logger.info("\nFuture Predictions (Predicted Points):")
             logger.info(f"{'Gameweek':<10} {'Opponent':<10} {'Venue':<10} {'Difficulty':<10} {'Predicted Points':<20}")
             for pred in predictions:
-                # Get opponent team name
-                team_result = supabase.table("teams").select("short_name").eq("team_id", pred['opponent_team_id']).execute()
-                opponent = team_result.data[0]['short_name'] if team_result.data else "N/A"
+                opponent = pred['opponent_team'].get('short_name', 'N/A') if isinstance(pred.get('opponent_team'), dict) else "N/A"
                 
                 venue = "Home" if pred['is_home'] else "Away"
                 difficulty_str = str(pred['difficulty']) if pred['difficulty'] is not None else "N/A"
@@ -5,12 +5,136 @@ FPL 价格变动监控 - 多数据源聚合
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+import logging
+import orjson
 import os
+import re
 import sys
-from typing import Dict, List, Optional
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 import unicodedata
+from functools import lru_cache
+
+
+# 不同来源的位置写法 -> GK/DEF/MID/FOR
+_POSITION_MAP = {
+    "goalkeeper": "GK",
+    "gk": "GK",
+    "defender": "DEF",
+    "def": "DEF",
+    "midfielder": "MID",
+    "mid": "MID",
+    "forward": "FOR",
+    "for": "FOR",
+    "fwd": "FOR",
+    "striker": "FOR",
+}
+
+
+logger = logging.getLogger(__name__)
+
+_TONIGHT_RE = re.compile('tonight', re.IGNORECASE)
+_TOMORROW_RE = re.compile('tomorrow', re.IGNORECASE)
+_NON_WORD_RE = re.compile(r'[^\w]+')
+
+
+def _name_tokens(norm_name: str) -> frozenset:
+    """规范化后的名字按非单词字符切分成单词集合（丢弃空串）"""
+    return frozenset(t for t in _NON_WORD_RE.split(norm_name) if t)
+
+
+def _ownership_value(raw) -> float:
+    """持有率转为数值（无法解析时视为 0），用于排序和合并择优"""
+    try:
+        return float(raw)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _source_names_by_mask(source_bits: Dict[str, int]) -> Dict[int, Tuple[str, ...]]:
+    """位掩码 -> 按名字排序的数据源元组，覆盖所有组合（元组不可变，可安全共享）"""
+    return {
+        mask: tuple(sorted(name for name, bit in source_bits.items() if mask & bit))
+        for mask in range(1 << len(source_bits))
+    }
+
+
+def _response_json(response: requests.Response):
+    """用 orjson 解析响应体（比 response.json() 的标准库解析快数倍）"""
+    return orjson.loads(response.content)
+
+
+def _write_atomic(path: str, content: bytes) -> None:
+    """先写入同目录的临时文件再 os.replace，读者只会看到完整的旧文件或新文件"""
+    # 临时文件名唯一，并发写同一路径的线程互不覆盖
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.", suffix='.tmp'
+    )
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _build_accent_table() -> Dict[int, str]:
+    """为 Latin-1 补充 / Latin 扩展-A 中的带重音字母构建去重音映射表"""
+    table = {}
+    for code in range(0x00C0, 0x0180):
+        ch = chr(code)
+        stripped = "".join(
+            c for c in unicodedata.normalize("NFKD", ch)
+            if not unicodedata.combining(c)
+        )
+        if stripped != ch and stripped.isascii():
+            table[code] = stripped
+    return table
+
+
+# 常见带重音字母的 str.translate 映射，单次 C 级扫描即可去重音
+_ACCENT_TABLE = _build_accent_table()
+
+
+# 规范化函数都是纯函数，同一批球员名字/球队/位置在一次运行中会被反复处理，缓存结果
+@lru_cache(maxsize=8192)
+def _normalize_name(name: str) -> str:
+    if not name:
+        return ""
+    s = str(name).strip().translate(_ACCENT_TABLE)
+    if not s.isascii():
+        # 映射表未覆盖的字符（组合符号、其他文字等）回退到完整的 NFKD 处理
+        s = "".join(
+            ch for ch in unicodedata.normalize("NFKD", s)
+            if not unicodedata.combining(ch)
+        )
+    s = " ".join(s.split())
+    return s.lower()
+
+
+@lru_cache(maxsize=8192)
+def _normalize_team(team: str) -> str:
+    if not team:
+        return ""
+    return " ".join(str(team).strip().split()).lower()
+
+
+@lru_cache(maxsize=8192)
+def _normalize_position(position: str) -> str:
+    if not position:
+        return "Unknown"
+    p = str(position).strip().lower()
+    return _POSITION_MAP.get(p, str(position).strip().upper())
 
 
 class FPLPriceMonitor:
@@ -22,6 +146,48 @@ class FPLPriceMonitor:
         'fix': 'https://allaboutfantasy.cn/api/getpricepredict?source=fix',
         'livefpl': 'https://allaboutfantasy.cn/api/getpricepredict?source=livefpl'
     }
+
+    # 每个数据源占一个二进制位，合并时用位或记录球员出现在哪些数据源
+    SOURCE_BITS = {name: 1 << i for i, name in enumerate(SOURCES)}
+    SOURCE_NAMES_BY_MASK = _source_names_by_mask(SOURCE_BITS)
+
+    BOOTSTRAP_URL = "https://fantasy.premierleague.com/api/bootstrap-static/"
+
+    # bootstrap-static 的本地缓存目录（配合 ETag / Last-Modified 做条件请求）
+    CACHE_DIR = os.getenv('FPL_CACHE_DIR', os.path.expanduser('~/.cache/fpl'))
+
+    # 用户阵容缓存的有效期（秒）
+    SQUAD_CACHE_TTL = 3600
+
+    # 变价时间的常见精确取值 -> 优先级（命中时无需转小写和子串扫描）
+    EXACT_TIME_PRIORITY = {
+        'Tonight': 0,
+        'tonight': 0,
+        'Tomorrow': 1,
+        'tomorrow': 1,
+    }
+
+    # 各数据源中可能出现的球员 ID 字段（按优先级）
+    PLAYER_ID_KEYS = (
+        "PlayerID", "PlayerId", "player_id", "playerId",
+        "id", "ID", "element", "Element", "code", "Code"
+    )
+
+    # 上涨 / 下跌分组的展示文案：(标题 emoji, 标题, 条目 emoji)
+    PLAYER_TYPE_LABELS = {
+        'risers': ("📈", "即将上涨", "🔺"),
+        'fallers': ("📉", "即将下跌", "🟢"),
+    }
+
+    # livefpl：progressTonight 绝对值超过该值才视为今晚会变价
+    LIVEFPL_PROGRESS_THRESHOLD = 100.0
+
+    # 各数据源的筛选规则（方法名）
+    SOURCE_FILTERS = {
+        'ffhub': 'is_tonight_player',
+        'fix': 'is_tonight_player',
+        'livefpl': 'is_livefpl_candidate',
+    }
     
     def __init__(self, feishu_webhook: Optional[str] = None, user_webhooks: Dict[int, str] = None):
         """
@@ -43,66 +209,157 @@ class FPLPriceMonitor:
             
         self.monitored_player_ids = set()
         self.data_cache = {}
+
+        # 共享 HTTP 会话：所有请求复用连接池（keep-alive），瞬时错误自动退避重试
+        self.session = requests.Session()
+        retry = Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            # webhook POST 只在连接阶段失败时重试，避免服务端已处理后重复推送
+            allowed_methods=frozenset({'GET'}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=16, pool_maxsize=32)
+        self.session.mount('https://', adapter)
         
         # FPL 静态数据缓存
         self.player_id_map = {} # id -> web_name
         self.player_name_map = {} # web_name -> id
+        self.current_gw = None # 静态数据获取失败时保持 None
         self.init_fpl_data()
 
     def init_fpl_data(self):
         """初始化 FPL 静态数据（用于 ID 和 名字 的转换）"""
         try:
             print("🔄 正在获取 FPL 静态数据...")
-            url = "https://fantasy.premierleague.com/api/bootstrap-static/"
-            response = requests.get(url, timeout=15)
-            response.raise_for_status()
-            data = response.json()
+            data = self.fetch_bootstrap_static()
             
-            for player in data.get('elements', []):
-                pid = player['id']
-                web_name = player['web_name']
-                # 同时也保存 full name 以防万一，但 web_name 通常是标准
-                self.player_id_map[pid] = web_name
-                self.player_name_map[web_name] = pid
-                # 也可以映射 full name
-                full_name = f"{player['first_name']} {player['second_name']}"
-                self.player_name_map[full_name] = pid
+            elements = data.get('elements', [])
+            self.player_id_map = {p['id']: p['web_name'] for p in elements}
+            # 同时也映射 full name 以防万一，但 web_name 通常是标准
+            self.player_name_map = {p['web_name']: p['id'] for p in elements}
+            self.player_name_map.update(
+                {f"{p['first_name']} {p['second_name']}": p['id'] for p in elements}
+            )
                 
             print(f"✅ FPL 静态数据获取成功 (共 {len(self.player_id_map)} 名球员)")
             
-            # 获取当前 GW
-            self.current_gw = 1
-            for event in data.get('events', []):
-                if event.get('is_current', False):
-                    self.current_gw = event['id']
-                    break
-                # 如果没有 current，找 next 的前一个
-                elif event.get('is_next', False):
-                    self.current_gw = max(1, event['id'] - 1)
-                    break
+            # 获取当前 GW；如果没有 current，取 next 的前一个
+            events = data.get('events', [])
+            self.current_gw = next(
+                (e['id'] for e in events if e.get('is_current', False)), None
+            ) or max(1, next((e['id'] - 1 for e in events if e.get('is_next', False)), 1))
             print(f"📅 当前/最近 Gameweek: {self.current_gw}")
             
         except Exception as e:
             print(f"❌ FPL 静态数据获取失败: {e}")
 
+    def fetch_bootstrap_static(self) -> Dict:
+        """
+        获取 bootstrap-static 数据，优先使用本地缓存
+        
+        带上缓存的 ETag / Last-Modified 发起条件请求；服务端返回 304 时直接读取
+        本地文件，避免重复下载和解析约 3MB 的 JSON。
+        
+        Returns:
+            bootstrap-static 数据字典
+        """
+        body_path = os.path.join(self.CACHE_DIR, 'bootstrap.json')
+        meta_path = os.path.join(self.CACHE_DIR, 'bootstrap.meta.json')
+
+        headers = {}
+        if os.path.exists(body_path) and os.path.exists(meta_path):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                if meta.get('etag'):
+                    headers['If-None-Match'] = meta['etag']
+                if meta.get('last_modified'):
+                    headers['If-Modified-Since'] = meta['last_modified']
+            except (OSError, ValueError):
+                headers = {}
+
+        response = self.session.get(self.BOOTSTRAP_URL, headers=headers, timeout=15)
+        if response.status_code == 304:
+            try:
+                with open(body_path, 'rb') as f:
+                    data = orjson.loads(f.read())
+                print("♻️ FPL 静态数据未变化，使用本地缓存")
+                return data
+            except (OSError, orjson.JSONDecodeError) as e:
+                # 本地缓存损坏或丢失：不带条件头重新下载一次
+                print(f"⚠️ 读取 FPL 静态数据缓存失败，重新下载: {e}")
+                response = self.session.get(self.BOOTSTRAP_URL, timeout=15)
+
+        response.raise_for_status()
+        data = _response_json(response)
+
+        try:
+            os.makedirs(self.CACHE_DIR, exist_ok=True)
+            # 先写数据再写元信息，都经临时文件原子替换，避免中断后留下半截缓存
+            _write_atomic(body_path, response.content)
+            _write_atomic(meta_path, orjson.dumps({
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }))
+        except OSError as e:
+            print(f"⚠️ 写入 FPL 静态数据缓存失败: {e}")
+
+        return data
+
+    def squad_cache_path(self, team_id: int, gameweek: int) -> str:
+        """用户某个 GW 阵容的本地缓存文件路径"""
+        return os.path.join(self.CACHE_DIR, f'squad_{team_id}_{gameweek}.json')
+
+    def load_cached_squad(self, team_id: int, gameweek: int) -> Optional[List[str]]:
+        """读取未过期的阵容缓存；不存在或已过期时返回 None"""
+        path = self.squad_cache_path(team_id, gameweek)
+        try:
+            if time.time() - os.path.getmtime(path) > self.SQUAD_CACHE_TTL:
+                return None
+            with open(path, 'rb') as f:
+                return orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+
+    def save_cached_squad(self, team_id: int, gameweek: int, player_names: List[str]) -> None:
+        """保存阵容缓存，失败时仅打印警告"""
+        try:
+            os.makedirs(self.CACHE_DIR, exist_ok=True)
+            _write_atomic(self.squad_cache_path(team_id, gameweek), orjson.dumps(player_names))
+        except OSError as e:
+            print(f"⚠️ 写入用户 {team_id} 阵容缓存失败: {e}")
+
     def get_user_squad_names(self, team_id: int) -> List[str]:
-        """获取用户当前阵容的球员名字列表"""
-        if not team_id:
+        """获取用户当前阵容的球员名字列表（同一 GW 内优先使用本地缓存）"""
+        # 没有当前 GW（静态数据获取失败）时无法定位阵容，也无从使用缓存
+        if not team_id or self.current_gw is None:
             return []
+
+        cached = self.load_cached_squad(team_id, self.current_gw)
+        if cached is not None:
+            return cached
             
         try:
             # 尝试获取 Picks (无需认证)
             # 注意：这获取的是该用户在该 GW 的阵容，不包含当周未生效的转会
-            url = f"https://fantasy.premierleague.com/api/entry/{team_id}/event/{self.current_gw}/picks/"
-            response = requests.get(url, timeout=10)
+            gameweek = self.current_gw
+            url = f"https://fantasy.premierleague.com/api/entry/{team_id}/event/{gameweek}/picks/"
+            response = self.session.get(url, timeout=10)
             
             # 如果该 GW 还没开始或没数据，可能返回 404，尝试上一周
             if response.status_code == 404 and self.current_gw > 1:
-                 url = f"https://fantasy.premierleague.com/api/entry/{team_id}/event/{self.current_gw - 1}/picks/"
-                 response = requests.get(url, timeout=10)
+                gameweek = self.current_gw - 1
+                cached = self.load_cached_squad(team_id, gameweek)
+                if cached is not None:
+                    return cached
+                url = f"https://fantasy.premierleague.com/api/entry/{team_id}/event/{gameweek}/picks/"
+                response = self.session.get(url, timeout=10)
             
             response.raise_for_status()
-            data = response.json()
+            data = _response_json(response)
             
             player_names = []
             for pick in data.get('picks', []):
@@ -110,33 +367,49 @@ class FPLPriceMonitor:
                 pname = self.player_id_map.get(pid)
                 if pname:
                     player_names.append(pname)
+
+            if player_names:
+                self.save_cached_squad(team_id, gameweek, player_names)
             
             return player_names
         except Exception as e:
             print(f"❌ 获取用户 {team_id} 阵容失败: {e}")
             return []
 
-    def fetch_data(self, source_name: str, url: str) -> Optional[Dict]:
+    def fetch_user_squads(self, team_ids: List[int]) -> Dict[int, List[str]]:
+        """
+        并发获取多个用户的阵容
+        
+        Args:
+            team_ids: 用户 ID 列表
+            
+        Returns:
+            用户 ID 到阵容球员名字列表的映射
+        """
+        if not team_ids:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(len(team_ids), 8)) as executor:
+            squads = executor.map(self.get_user_squad_names, team_ids)
+            return dict(zip(team_ids, squads))
+
+    def fetch_data(self, source_name: str, url: str) -> Dict:
         """
-        从指定数据源获取数据
+        从指定数据源获取数据（在线程池中并发调用，不输出日志）
         
         Args:
             source_name: 数据源名称
             url: API URL
             
         Returns:
-            数据字典或 None
+            数据字典
+            
+        Raises:
+            requests.exceptions.RequestException / orjson.JSONDecodeError: 获取或解析失败
         """
-        try:
-            print(f"🔍 正在获取 {source_name} 数据...")
-            response = requests.get(url, timeout=15)
-            response.raise_for_status()
-            data = response.json()
-            print(f"✅ {source_name} 数据获取成功")
-            return data
-        except requests.exceptions.RequestException as e:
-            print(f"❌ {source_name} 数据获取失败: {e}")
-            return None
+        response = self.session.get(url, timeout=15)
+        response.raise_for_status()
+        return _response_json(response)
     
     def fetch_all_sources(self) -> Dict[str, Dict]:
         """
@@ -145,10 +418,25 @@ class FPLPriceMonitor:
         Returns:
             所有数据源的数据字典
         """
+        # 并发请求各数据源，总耗时取决于最慢的那个；
+        # 日志只在主线程输出，避免多个线程同时 print 导致行交错
+        for source_name in self.SOURCES:
+            print(f"🔍 正在获取 {source_name} 数据...")
+        with ThreadPoolExecutor(max_workers=len(self.SOURCES)) as executor:
+            futures = {
+                source_name: executor.submit(self.fetch_data, source_name, url)
+                for source_name, url in self.SOURCES.items()
+            }
+
+        # 按 SOURCES 的顺序收集结果并报告，保证输出和后续合并顺序稳定
         all_data = {}
-        
-        for source_name, url in self.SOURCES.items():
-            data = self.fetch_data(source_name, url)
+        for source_name, future in futures.items():
+            try:
+                data = future.result()
+            except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+                print(f"❌ {source_name} 数据获取失败: {e}")
+                continue
+            print(f"✅ {source_name} 数据获取成功")
             if data:
                 all_data[source_name] = data
         
@@ -167,53 +455,38 @@ class FPLPriceMonitor:
         """
         if not change_time or change_time == 'Unknown':
             return False
-        return 'tonight' in str(change_time).lower()
+        return self.get_time_priority(str(change_time)) == 0
+
+    def is_tonight_player(self, player: Dict) -> bool:
+        """ffhub 和 fix：仅保留今晚（tonight）会变价的数据"""
+        return self.is_tonight(player.get('ChangeTime', player.get('change', '')))
+
+    def is_livefpl_candidate(self, player: Dict) -> bool:
+        """livefpl：只要 progressTonight > 100 或 < -100（见 LIVEFPL_PROGRESS_THRESHOLD）"""
+        progress_tonight_raw = player.get('progressTonight', '')
+        try:
+            progress_tonight = float(progress_tonight_raw) if progress_tonight_raw else 0
+        except (ValueError, TypeError):
+            return False
+        return abs(progress_tonight) > self.LIVEFPL_PROGRESS_THRESHOLD
 
     def normalize_name(self, name: str) -> str:
         """用于合并去重的名字规范化：去重音、去空白、转小写。"""
-        if not name:
-            return ""
-        s = str(name).strip()
-        s = "".join(
-            ch for ch in unicodedata.normalize("NFKD", s)
-            if not unicodedata.combining(ch)
-        )
-        s = " ".join(s.split())
-        return s.lower()
+        return _normalize_name(name)
 
     def normalize_team(self, team: str) -> str:
-        if not team:
-            return ""
-        return " ".join(str(team).strip().split()).lower()
+        return _normalize_team(team)
 
     def normalize_position(self, position: str) -> str:
         """将不同来源的位置统一到 GK/DEF/MID/FOR。"""
-        if not position:
-            return "Unknown"
-        p = str(position).strip().lower()
-        mapping = {
-            "goalkeeper": "GK",
-            "gk": "GK",
-            "defender": "DEF",
-            "def": "DEF",
-            "midfielder": "MID",
-            "mid": "MID",
-            "forward": "FOR",
-            "for": "FOR",
-            "fwd": "FOR",
-            "striker": "FOR",
-        }
-        return mapping.get(p, str(position).strip().upper())
+        return _normalize_position(position)
 
     def extract_player_id(self, player: Dict) -> Optional[str]:
         """尽量从数据源中提取稳定的球员 ID；提取不到则返回 None。"""
-        candidates = [
-            "PlayerID", "PlayerId", "player_id", "playerId",
-            "id", "ID", "element", "Element", "code", "Code"
-        ]
-        for k in candidates:
-            if k in player and player.get(k) not in (None, "", "Unknown"):
-                return str(player.get(k))
+        for k in self.PLAYER_ID_KEYS:
+            value = player.get(k)
+            if value not in (None, "", "Unknown"):
+                return str(value)
         return None
     
     def analyze_source_data(self, source_name: str, data: Dict, 
@@ -240,7 +513,13 @@ class FPLPriceMonitor:
             risers = []
             fallers = []
             
-            for player in players:
+            # 根据数据源选择筛选规则（每个数据源只分派一次，而不是每名球员判断一次）
+            filter_name = self.SOURCE_FILTERS.get(source_name)
+            should_include = getattr(self, filter_name) if filter_name else None
+            # 先筛出少量候选球员（内置 filter 在 C 层循环），只对它们做字段提取和转换
+            candidates = list(filter(should_include, players)) if should_include else []
+
+            for player in candidates:
                 # 获取进度值，并确保是数值类型
                 target_raw = player.get('Target',
                                         player.get('threshold',
@@ -249,51 +528,32 @@ class FPLPriceMonitor:
                     target = float(target_raw) if target_raw else 0
                 except (ValueError, TypeError):
                     target = 0
-                
-                # 获取额外字段
-                change_time = player.get('ChangeTime', player.get('change', ''))
-
-                # 根据数据源应用不同的筛选规则
-                should_include = False
-
-                if source_name in ['ffhub', 'fix']:
-                    # ffhub 和 fix：仅保留今晚（tonight）会变价的数据
-                    should_include = self.is_tonight(change_time)
-
-                elif source_name == 'livefpl':
-                    # livefpl：只要 progressTonight > 100 或 < -100
-                    progress_tonight_raw = player.get('progressTonight', '')
-                    try:
-                        progress_tonight = float(progress_tonight_raw) if progress_tonight_raw else 0
-                        if abs(progress_tonight) > 100:
-                            should_include = True
-                    except (ValueError, TypeError):
-                        should_include = False
-                
-                # 如果符合条件，添加到对应列表
-                if should_include:
-                    raw_position = player.get('Position', player.get('position', 'Unknown'))
-                    player_data = {
-                        'merge_key': None,
-                        'name': player.get('PlayerName', player.get('name', 'Unknown')),
-                        'team': player.get('Team', player.get('team', 'Unknown')),
-                        'position': self.normalize_position(raw_position),
-                        'price': player.get('Value',
-                                            player.get('value',
-                                                       player.get('price', 0))),
-                        'ownership': player.get('Ownership', player.get('ownership', 0))
-                    }
 
-                    # 注意：不同数据源的“ID”口径可能不同，会导致同一球员无法合并；
-                    # 因此合并键统一使用（去重音后的）姓名 + 球队。
-                    norm_name = self.normalize_name(player_data.get('name', ''))
-                    norm_team = self.normalize_team(player_data.get('team', ''))
-                    player_data['merge_key'] = f"name:{norm_name}|team:{norm_team}"
-                    
-                    if target >= 0:  # 上涨
-                        risers.append(player_data)
-                    else:  # 下跌
-                        fallers.append(player_data)
+                # 符合条件，添加到对应列表
+                raw_position = player.get('Position', player.get('position', 'Unknown'))
+                player_data = {
+                    'merge_key': None,
+                    'name': player.get('PlayerName', player.get('name', 'Unknown')),
+                    'team': player.get('Team', player.get('team', 'Unknown')),
+                    'position': self.normalize_position(raw_position),
+                    'price': player.get('Value',
+                                        player.get('value',
+                                                   player.get('price', 0))),
+                    'ownership': player.get('Ownership', player.get('ownership', 0))
+                }
+                player_data['ownership_value'] = _ownership_value(player_data['ownership'])
+
+                # 注意：不同数据源的“ID”口径可能不同，会导致同一球员无法合并；
+                # 因此合并键统一使用（去重音后的）姓名 + 球队。
+                norm_name = self.normalize_name(player_data.get('name', ''))
+                norm_team = self.normalize_team(player_data.get('team', ''))
+                player_data['norm_name'] = norm_name
+                player_data['merge_key'] = f"name:{norm_name}|team:{norm_team}"
+                
+                if target >= 0:  # 上涨
+                    risers.append(player_data)
+                else:  # 下跌
+                    fallers.append(player_data)
         else:
             return {
                 'source': source_name,
@@ -318,25 +578,33 @@ class FPLPriceMonitor:
         if not change_time:
             return 2
 
-        change_time_lower = change_time.lower()
-        if 'tonight' in change_time_lower:
+        priority = self.EXACT_TIME_PRIORITY.get(change_time)
+        if priority is not None:
+            return priority
+        # 预编译的忽略大小写正则，不必为每个值分配小写副本
+        if _TONIGHT_RE.search(change_time):
             return 0
-        if 'tomorrow' in change_time_lower:
+        if _TOMORROW_RE.search(change_time):
             return 1
         return 2
 
     def sort_players(self, players: List[Dict], player_type: str) -> None:
         # 由于合并消息已取消 progress/progress_tonight，这里按持有率（高->低）再按名字排序
-        def ownership_value(player: Dict) -> float:
-            raw = player.get('ownership', 0)
-            try:
-                return float(raw)
-            except (ValueError, TypeError):
-                return 0.0
+        # 持有率数值每名球员只解析一次，排序 key 中不再做 try/except
+        for p in players:
+            if 'ownership_value' not in p:
+                p['ownership_value'] = _ownership_value(p.get('ownership', 0))
 
-        players.sort(key=lambda p: (-ownership_value(p), str(p.get('name', ''))))
+        players.sort(key=lambda p: (-p['ownership_value'], str(p.get('name', ''))))
     
 
+    def source_bit(self, source: Optional[str]) -> int:
+        """数据源名 -> 位掩码中的位；未登记的数据源直接报错，避免合并时被悄悄丢掉"""
+        try:
+            return self.SOURCE_BITS[source]
+        except KeyError:
+            raise ValueError(f"未知数据源: {source!r}") from None
+
     def merge_players_by_sources(self, analyses: List[Dict]) -> Dict[str, List[Dict]]:
         """
         将多个数据源的球员列表合并，按球员聚合来源。
@@ -344,12 +612,37 @@ class FPLPriceMonitor:
         Returns:
             {'risers': [...], 'fallers': [...]}
         """
+        # 没有结果的数据源不参与聚合
+        valid_analyses = [
+            a for a in analyses
+            if 'error' not in a and (a.get('risers') or a.get('fallers'))
+        ]
+
+        if len(valid_analyses) == 1:
+            # 单数据源无需聚合：分析结果已按持有率排好序，直接附上来源即可
+            analysis = valid_analyses[0]
+            sources = self.SOURCE_NAMES_BY_MASK[self.source_bit(analysis.get('source'))]
+            return {
+                player_type: [
+                    {
+                        'name': p.get('name', 'Unknown'),
+                        'norm_name': p.get('norm_name'),
+                        'team': p.get('team', 'Unknown'),
+                        'position': self.normalize_position(p.get('position', 'Unknown')),
+                        'price': p.get('price', 0),
+                        'ownership': p.get('ownership', 0),
+                        'ownership_value': p.get('ownership_value', 0.0),
+                        'sources': sources
+                    }
+                    for p in analysis.get(player_type, [])
+                ]
+                for player_type in ('risers', 'fallers')
+            }
+
         merged = {'risers': {}, 'fallers': {}}
 
-        for analysis in analyses:
-            source = analysis.get('source', 'Unknown')
-            if 'error' in analysis:
-                continue
+        for analysis in valid_analyses:
+            source_bit = self.source_bit(analysis.get('source'))
 
             for player_type in ('risers', 'fallers'):
                 for p in analysis.get(player_type, []):
@@ -359,247 +652,111 @@ class FPLPriceMonitor:
                         norm_name = self.normalize_name(p.get('name', ''))
                         norm_team = self.normalize_team(p.get('team', ''))
                         key = f"name:{norm_name}|team:{norm_team}"
+                    new_own = p.get('ownership_value')
+                    if new_own is None:
+                        new_own = _ownership_value(p.get('ownership', 0))
                     if key not in merged[player_type]:
                         merged[player_type][key] = {
                             'name': p.get('name', 'Unknown'),
+                            'norm_name': p.get('norm_name'),
                             'team': p.get('team', 'Unknown'),
                             'position': self.normalize_position(p.get('position', 'Unknown')),
                             'price': p.get('price', 0),
                             'ownership': p.get('ownership', 0),
-                            'sources': set()
+                            'ownership_value': new_own,
+                            'source_mask': 0
                         }
                     else:
                         # 合并时做一点“择优”：持有率更高的覆盖（不同源小数位差异时更稳定）
-                        try:
-                            cur_own = float(merged[player_type][key].get('ownership', 0))
-                        except (ValueError, TypeError):
-                            cur_own = 0.0
-                        try:
-                            new_own = float(p.get('ownership', 0))
-                        except (ValueError, TypeError):
-                            new_own = 0.0
-                        if new_own > cur_own:
-                            merged[player_type][key]['ownership'] = p.get('ownership', merged[player_type][key].get('ownership', 0))
-
-                        # position 统一后保持成 GK/DEF/MID/FOR
-                        merged[player_type][key]['position'] = self.normalize_position(
-                            merged[player_type][key].get('position', p.get('position', 'Unknown'))
-                        )
-                    merged[player_type][key]['sources'].add(source)
+                        entry = merged[player_type][key]
+                        if new_own > entry['ownership_value']:
+                            entry['ownership'] = p.get('ownership', entry.get('ownership', 0))
+                            entry['ownership_value'] = new_own
+
+                    merged[player_type][key]['source_mask'] |= source_bit
 
         risers = list(merged['risers'].values())
         fallers = list(merged['fallers'].values())
         self.sort_players(risers, 'risers')
         self.sort_players(fallers, 'fallers')
 
-        # 将 sources set 转成排序后的 list，方便格式化
+        # 来源位掩码直接查表得到排好序的来源名，无需逐个排序
         for p in risers + fallers:
-            p['sources'] = sorted(list(p.get('sources', [])))
+            p['sources'] = self.SOURCE_NAMES_BY_MASK[p.pop('source_mask')]
 
         return {'risers': risers, 'fallers': fallers}
 
-    def format_merged_players_as_string(self, players: List[Dict], player_type: str) -> str:
-        """
-        按参考格式输出（编号 + emoji + 两段式详情），并在位置之后追加数据源。
-        """
-        is_risers = player_type == "risers"
-        header_emoji = "📈" if is_risers else "📉"
-        header_text = "即将上涨" if is_risers else "即将下跌"
-        item_emoji = "🔺" if is_risers else "🟢"
-
-        if not players:
-            return f"{header_emoji} {header_text} (共 0 人)\n暂无符合条件的球员"
-
-        # 不要输出任何空白行：每个球员严格两行（信息行 + 价格行）
-        lines = [f"{header_emoji} {header_text} (共 {len(players)} 人)"]
-
-        for i, player in enumerate(players, 1):
-            sources = ",".join(player.get('sources', [])) or "Unknown"
-            name = player.get('name', 'Unknown')
-            team = player.get('team', 'Unknown')
-            position = self.normalize_position(player.get('position', 'Unknown'))
-            price = player.get('price', 0)
-            ownership = player.get('ownership', 0)
-
-            lines.append(f"{i}. {item_emoji} {name} ({team}) - {position} ({sources})")
-            lines.append(f"   价格: £{price}m | 持有率: {ownership}%")
-
-        return "\n".join(lines).rstrip()
-
-    def build_feishu_message_merged(self, analyses: List[Dict]) -> Dict:
-        """
-        构建飞书消息（合并三个数据源，且仅展示 tonight）。
+    def build_squad_matcher(self, user_squad_names: List[str]) -> Callable[[Dict], bool]:
         """
-        merged = self.merge_players_by_sources(analyses)
-
-        risers_text = self.format_merged_players_as_string(merged.get('risers', []), "risers")
-        fallers_text = self.format_merged_players_as_string(merged.get('fallers', []), "fallers")
-
-        # 分组之间也不输出空白行
-        text = f"{risers_text}\n{fallers_text}"
-
-        return {
-            "msg_type": "post",
-            "content": {
-                "post": {
-                    "zh_cn": {
-                        "title": "🏆 FPL 价格变动监控（合并）",
-                        "content": [
-                            [
-                                {
-                                    "tag": "text",
-                                    "text": text
-                                }
-                            ]
-                        ]
-                    }
-                }
-            }
-        }
-    
-    def filter_analysis_for_user(self, analysis: Dict, user_squad_names: List[str]) -> Dict:
-        """为特定用户筛选分析结果（基于名字匹配）"""
-        if 'error' in analysis:
-            return analysis
-            
-        filtered_analysis = analysis.copy()
+        根据用户阵容名字构建球员匹配函数
         
-        # 筛选 Risers
-        filtered_risers = []
-        for player in analysis.get('risers', []):
-            # 模糊匹配：检查预测的名字是否包含在用户阵容名字中，或者用户阵容名字包含预测名字
-            # 这里简单起见，使用包含关系，因为 web_name 有时会有差异
-            p_name = player['name']
+        Args:
+            user_squad_names: 用户阵容的球员名字列表
             
-            # 尝试直接匹配
-            if p_name in user_squad_names:
-                filtered_risers.append(player)
-                continue
-                
-            # 尝试部分匹配 (例如 Son Heung-min vs Son)
-            for user_p_name in user_squad_names:
-                if p_name in user_p_name or user_p_name in p_name:
-                    filtered_risers.append(player)
-                    break
-        
-        filtered_analysis['risers'] = filtered_risers
-        filtered_analysis['risers_count'] = len(filtered_risers)
-        
-        # 筛选 Fallers
-        filtered_fallers = []
-        for player in analysis.get('fallers', []):
-            p_name = player['name']
-            if p_name in user_squad_names:
-                filtered_fallers.append(player)
-                continue
-            for user_p_name in user_squad_names:
-                if p_name in user_p_name or user_p_name in p_name:
-                    filtered_fallers.append(player)
-                    break
-                    
-        filtered_analysis['fallers'] = filtered_fallers
-        filtered_analysis['fallers_count'] = len(filtered_fallers)
-        
-        return filtered_analysis
+        Returns:
+            判断球员是否在该阵容中的函数
+        """
+        # 阵容名字按规范化后的单词建立索引：单词 -> 包含该单词的阵容名字（单词集合）
+        # 按非单词字符切分，B.Fernandes / Alexander-Arnold 也能拆出 fernandes / arnold
+        squad_names = []
+        squad_index = {}
+        for user_p_name in user_squad_names:
+            norm_squad_name = self.normalize_name(user_p_name)
+            squad_names.append(norm_squad_name)
+            squad_tokens = _name_tokens(norm_squad_name)
+            for token in squad_tokens:
+                squad_index.setdefault(token, []).append(squad_tokens)
+
+        def in_squad(player: Dict) -> bool:
+            # 模糊匹配：两边名字按单词互相包含即视为同一球员 (例如 Son Heung-min vs Son)
+            norm_name = player.get('norm_name') or self.normalize_name(player['name'])
+            p_tokens = _name_tokens(norm_name)
+            for token in p_tokens:
+                for squad_tokens in squad_index.get(token, ()):
+                    if squad_tokens <= p_tokens or p_tokens <= squad_tokens:
+                        return True
+            if not norm_name:
+                return False
+            # 单词匹配不上时退回子串包含（与原先的匹配规则一致）
+            return any(
+                norm_name in squad_name or squad_name in norm_name
+                for squad_name in squad_names
+                if squad_name
+            )
 
-    def build_combined_feishu_message(self, analyses: List[Dict], title: str = "🏆 FPL 价格变动监控") -> Dict:
+        return in_squad
+
+    def build_message_from_merged(self, merged: Dict[str, List[Dict]], title: str) -> Dict:
         """
-        构建合并的飞书消息（多个数据源聚合）
+        用已合并的球员列表构建飞书消息
         
         Args:
-            analyses: 分析结果列表
+            merged: merge_players_by_sources 的结果（可以是按用户阵容筛选后的子集）
             title: 消息标题
             
         Returns:
             飞书消息体
         """
-        if not analyses:
-            return {}
-            
-        # 1. 聚合数据
-        merged_risers = {}
-        merged_fallers = {}
-        
-        def normalize_position(pos):
-            """标准化位置名称"""
-            if not pos: return ""
-            pos = pos.upper()
-            if 'MID' in pos: return 'MID'
-            if 'FOR' in pos or 'FWD' in pos: return 'FOR'
-            if 'DEF' in pos: return 'DEF'
-            if 'GOA' in pos or 'GKP' in pos: return 'GKP'
-            return pos
-
-        def process_players(player_list, target_dict, source_name):
-            for p in player_list:
-                name = p.get('name')
-                team = p.get('team')
-                # 唯一键：名字 + 球队 (防止同名)
-                key = (name, team)
-                
-                if key not in target_dict:
-                    target_dict[key] = {
-                        'name': name,
-                        'team': team,
-                        'position': normalize_position(p.get('position', '')),
-                        'price': p.get('price'),
-                        'ownership': p.get('ownership', 0),
-                        'sources': set()
-                    }
-                
-                # 记录数据源
-                target_dict[key]['sources'].add(source_name)
-                # 更新持有率（取最大值）
-                current_own = target_dict[key]['ownership']
-                new_own = p.get('ownership', 0)
-                try:
-                    if float(new_own) > float(current_own):
-                        target_dict[key]['ownership'] = new_own
-                except (ValueError, TypeError):
-                    pass
-
-        for analysis in analyses:
-            source = analysis.get('source', 'Unknown')
-            if 'error' in analysis:
-                continue
-                
-            process_players(analysis.get('risers', []), merged_risers, source)
-            process_players(analysis.get('fallers', []), merged_fallers, source)
-            
-        # 2. 排序 (按持有率降序)
-        def get_ownership(item):
-            try:
-                return float(item['ownership'])
-            except (ValueError, TypeError):
-                return 0
+        sorted_risers = merged.get('risers', [])
+        sorted_fallers = merged.get('fallers', [])
 
-        sorted_risers = sorted(merged_risers.values(), key=get_ownership, reverse=True)
-        sorted_fallers = sorted(merged_fallers.values(), key=get_ownership, reverse=True)
-        
-        # 3. 构建文本
-        full_text = ""
-        
-        # Risers
-        if sorted_risers:
-            full_text += f"📈 即将上涨 (共 {len(sorted_risers)} 人)\n"
-            for i, p in enumerate(sorted_risers, 1):
-                sources_str = ",".join(sorted(p['sources']))
-                full_text += f"{i}. 🔺 {p['name']} ({p['team']}) - {p['position']} ({sources_str})\n"
-                full_text += f"   价格: £{p['price']}m | 持有率: {p['ownership']}%\n"
+        # 构建文本（逐行收集，最后一次性拼接）
+        lines = []
         
-        # Fallers
-        if sorted_fallers:
-            if full_text: full_text += "\n"
-            full_text += f"📉 即将下跌 (共 {len(sorted_fallers)} 人)\n"
-            for i, p in enumerate(sorted_fallers, 1):
-                sources_str = ",".join(sorted(p['sources']))
-                full_text += f"{i}. 🟢 {p['name']} ({p['team']}) - {p['position']} ({sources_str})\n"
-                full_text += f"   价格: £{p['price']}m | 持有率: {p['ownership']}%\n"
+        for player_type, players in (('risers', sorted_risers), ('fallers', sorted_fallers)):
+            if not players:
+                continue
+            # 两组之间空一行
+            if lines:
+                lines.append("")
+            header_emoji, header_text, item_emoji = self.PLAYER_TYPE_LABELS[player_type]
+            lines.append(f"{header_emoji} {header_text} (共 {len(players)} 人)")
+            for i, p in enumerate(players, 1):
+                sources_str = ",".join(p['sources'])
+                lines.append(f"{i}. {item_emoji} {p['name']} ({p['team']}) - {p['position']} ({sources_str})")
+                lines.append(f"   价格: £{p['price']}m | 持有率: {p['ownership']}%")
                 
-        if not full_text:
-            full_text = "暂无相关变动"
-            
-        full_text = full_text.strip()
+        full_text = "\n".join(lines).strip() or "暂无相关变动"
 
         # 构建消息
         message = {
@@ -630,14 +787,14 @@ class FPLPriceMonitor:
         
         try:
             # print(f"📤 正在发送消息到 {webhook_url[:10]}...")
-            response = requests.post(
+            response = self.session.post(
                 webhook_url,
-                json=message,
+                data=orjson.dumps(message),
                 headers={'Content-Type': 'application/json'},
                 timeout=10
             )
             response.raise_for_status()
-            result = response.json()
+            result = _response_json(response)
             if result.get('code') == 0 or result.get('StatusCode') == 0:
                 return True
             return False
@@ -675,6 +832,9 @@ class FPLPriceMonitor:
             print(f"   - 接近下跌: {analysis.get('fallers_count', 0)} 人")
         
         print()
+
+        # 所有数据源只聚合一次，全局通知和个人通知共用
+        merged = self.merge_players_by_sources(analyses)
         
         # 3. 发送全局通知 (Default Webhook)
         if self.feishu_webhook:
@@ -682,13 +842,11 @@ class FPLPriceMonitor:
             print("📤 发送全局通知 (合并)")
             print("="*80)
             
-            # 过滤掉没有结果的数据源用于聚合，但实际上 build_combined 已经能处理
-            valid_global_analyses = [a for a in analyses if a.get('risers_count', 0) > 0 or a.get('fallers_count', 0) > 0]
-            
-            if valid_global_analyses:
-                global_message = self.build_combined_feishu_message(valid_global_analyses, title="🏆 FPL 价格变动监控（合并）")
-                print("--- Global Combined Message Content ---")
-                print(json.dumps(global_message, indent=2, ensure_ascii=False))
+            if merged['risers'] or merged['fallers']:
+                global_message = self.build_message_from_merged(merged, title="🏆 FPL 价格变动监控（合并）")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("--- Global Combined Message Content ---\n%s",
+                                 orjson.dumps(global_message, option=orjson.OPT_INDENT_2).decode())
                 self.send_to_webhook(global_message, self.feishu_webhook)
             else:
                 print("ℹ️ 无符合条件的变动，跳过全局通知")
@@ -699,30 +857,31 @@ class FPLPriceMonitor:
             print("👤 处理个人用户通知")
             print("="*80)
             
+            # 所有用户的阵容请求并发发出，之后逐个处理
+            user_squads = self.fetch_user_squads(list(self.user_webhooks))
+
             for team_id, webhook_url in self.user_webhooks.items():
                 print(f"🔍 检查用户 {team_id} 的阵容...")
-                squad_names = self.get_user_squad_names(team_id)
+                squad_names = user_squads.get(team_id, [])
                 if not squad_names:
                     print(f"   ⚠️ 无法获取用户 {team_id} 的阵容或阵容为空")
                     continue
                     
                 print(f"   ✅ 用户 {team_id} 阵容包含 {len(squad_names)} 名球员")
                 
-                # 收集该用户所有数据源的分析结果
-                user_valid_analyses = []
-                for analysis in analyses:
-                    # 为用户筛选结果
-                    user_analysis = self.filter_analysis_for_user(analysis, squad_names)
-                    
-                    if user_analysis.get('risers_count', 0) > 0 or user_analysis.get('fallers_count', 0) > 0:
-                        print(f"   Found match in {analysis['source']}: +{user_analysis['risers_count']} / -{user_analysis['fallers_count']}")
-                        user_valid_analyses.append(user_analysis)
+                # 在已合并的结果上按阵容筛选，无需为每个用户重新聚合
+                in_squad = self.build_squad_matcher(squad_names)
+                user_merged = {
+                    player_type: [p for p in players if in_squad(p)]
+                    for player_type, players in merged.items()
+                }
                 
-                if user_valid_analyses:
-                    print(f"   📤 正在合并 {len(user_valid_analyses)} 个数据源的通知发送给用户 {team_id}...")
-                    combined_message = self.build_combined_feishu_message(user_valid_analyses, title="🏆 FPL 价格变动监控 (你的阵容)")
-                    print(f"--- Combined User Message Content (User {team_id}) ---")
-                    print(json.dumps(combined_message, indent=2, ensure_ascii=False))
+                if user_merged['risers'] or user_merged['fallers']:
+                    print(f"   📤 用户 {team_id} 阵容中 +{len(user_merged['risers'])} / -{len(user_merged['fallers'])} 名球员有价格变动，正在发送通知...")
+                    combined_message = self.build_message_from_merged(user_merged, title="🏆 FPL 价格变动监控 (你的阵容)")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("--- Combined User Message Content (User %s) ---\n%s", team_id,
+                                     orjson.dumps(combined_message, option=orjson.OPT_INDENT_2).decode())
                     if self.send_to_webhook(combined_message, webhook_url):
                         print(f"   ✅ 用户 {team_id} 通知发送成功")
                     else:
@@ -736,8 +895,21 @@ class FPLPriceMonitor:
 
 
 
+def _log_level_from_env() -> int:
+    """读取 LOG_LEVEL；取值无效时回退到 INFO，避免启动时因拼写错误直接报错"""
+    name = (os.getenv('LOG_LEVEL') or 'INFO').strip().upper()
+    level = logging.getLevelNamesMapping().get(name)
+    if level is None:
+        print(f"⚠️ 无效的 LOG_LEVEL={name!r}，使用 INFO")
+        return logging.INFO
+    return level
+
+
 def main():
     """主函数"""
+    # 设置 LOG_LEVEL=DEBUG 可输出完整的消息内容
+    logging.basicConfig(level=_log_level_from_env(), format='%(levelname)s %(message)s')
+
     # 从环境变量读取飞书 webhook
     feishu_webhook = "https://www.feishu.cn/flow/api/trigger-webhook/2791fe5ac1644dfc97bb872bc41dce35"
     
@@ -1,11 +1,13 @@
 import asyncio
-from typing import List, Optional, AsyncIterator, Dict, Union
+import time
+from typing import Any, Awaitable, Callable, List, Optional, AsyncIterator, Dict, Tuple, Union
 from contextlib import asynccontextmanager
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 from dotenv import load_dotenv
-from supabase import create_client
+import httpx
+from supabase import acreate_client, AsyncClient, AsyncClientOptions
 
 from mcp.server.fastmcp import FastMCP, Context
 from mcp.server.session import ServerSession
@@ -28,10 +30,10 @@ SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("Supabase credentials (SUPABASE_URL and SUPABASE_KEY) are required and not found in environment variables")
 
-# Initialize Supabase client
-supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
-logger.info("Supabase client initialized successfully")
-
+# Connection pool sizing for concurrent tool calls: idle connections kept warm,
+# plus headroom for bursts before requests have to wait for a free connection
+SUPABASE_POOL_SIZE = int(os.environ.get('SUPABASE_POOL_SIZE', 20))
+SUPABASE_MAX_OVERFLOW = int(os.environ.get('SUPABASE_MAX_OVERFLOW', 40))
 
 
 # --- Pydantic Models for tool outputs ---
@@ -124,17 +126,53 @@ class FixtureInfo(FPLBaseModel):
     is_home: bool
     difficulty: int
 
+# Validate whole result sets in one pydantic-core call instead of one call per row
+_PLAYER_LIST = TypeAdapter(List[PlayerBase])
+_PREDICTION_LIST = TypeAdapter(List[PredictionBase])
+_HISTORY_LIST = TypeAdapter(List[PlayerHistoryBase])
+
+# Only fetch the players columns PlayerBase actually uses
+_PLAYER_COLUMNS = ", ".join(PlayerBase.model_fields)
+
 # --- Lifespan and Context Management ---
 @dataclass
 class AppContext:
-    """Application context to hold the Supabase client and FPL client."""
+    """Application context to hold the Supabase client, FPL client and cached team map.
+
+    The Supabase client is stateless between queries (each call builds its own
+    request), so one instance is safely shared by concurrent tool calls.
+    """
     fpl_client: FPL
-    supabase: any
+    supabase: AsyncClient
+    team_map: Dict[int, str] = field(default_factory=dict)
+    team_map_loaded_at: float = 0.0
+    fpl_cache: Dict[str, Tuple[float, Any]] = field(default_factory=dict)
 
 @asynccontextmanager
 async def app_lifespan(server: FastMCP) -> AsyncIterator[AppContext]:
     """Manage the Supabase client and FPL client lifecycle."""
-    
+
+    # Shared HTTP client for all Supabase calls: keeps TCP/TLS connections alive
+    # across tool invocations instead of re-handshaking for every small query.
+    supabase_http_client = httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(30.0),
+        limits=httpx.Limits(
+            max_connections=SUPABASE_POOL_SIZE + SUPABASE_MAX_OVERFLOW,
+            max_keepalive_connections=SUPABASE_POOL_SIZE,
+            keepalive_expiry=60,
+        ),
+        follow_redirects=True,
+    )
+
+    # Async client so queries don't block the event loop while other tools run
+    supabase_client = await acreate_client(
+        SUPABASE_URL,
+        SUPABASE_KEY,
+        options=AsyncClientOptions(httpx_client=supabase_http_client),
+    )
+    logger.info("Supabase client initialized successfully")
+
     fpl_client = FPL()
     
     email = os.getenv("FPL_EMAIL")
@@ -150,21 +188,59 @@ async def app_lifespan(server: FastMCP) -> AsyncIterator[AppContext]:
         print("FPL_EMAIL and/or FPL_PASSWORD not set in .env file.")
         fpl_client = None
 
+    app_ctx = AppContext(fpl_client=fpl_client, supabase=supabase_client)
+    # Warm the team map; _get_team_map reloads it later if it is empty or stale
+    await _get_team_map(app_ctx)
+
     try:
-        yield AppContext(fpl_client=fpl_client, supabase=supabase_client)
+        yield app_ctx
     finally:
-        # No database connection to close
-        pass
+        # Release pooled Supabase connections
+        await supabase_http_client.aclose()
+
+
+_POSITION_MAP: Dict[int, str] = {
+    1: "GK",
+    2: "DEF",
+    3: "MID",
+    4: "FWD"
+}
 
 
 def get_player_position(element_type: int) -> str:
     """Converts player element type to a position string."""
-    return {
-        1: "GK",
-        2: "DEF",
-        3: "MID",
-        4: "FWD"
-    }.get(element_type, "UNK")
+    return _POSITION_MAP.get(element_type, "UNK")
+
+
+# FPL user data changes at most a few times per gameweek
+_FPL_CACHE_TTL = 60.0
+
+
+async def _cached_fpl_call(cache: Dict[str, Tuple[float, Any]], key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """Returns a cached FPL API result, calling fetch again once it is older than _FPL_CACHE_TTL."""
+    now = time.monotonic()
+    hit = cache.get(key)
+    if hit is not None and now - hit[0] < _FPL_CACHE_TTL:
+        return hit[1]
+    value = await fetch()
+    cache[key] = (now, value)
+    return value
+
+
+# Teams rarely change within a season, but the table may still be empty when the
+# server starts before the data loader has run
+_TEAM_MAP_TTL = 3600.0
+
+
+async def _get_team_map(app_ctx: AppContext) -> Dict[int, str]:
+    """Returns the cached team_id -> name map, reloading it once it is older than _TEAM_MAP_TTL or still empty."""
+    now = time.monotonic()
+    if app_ctx.team_map and now - app_ctx.team_map_loaded_at < _TEAM_MAP_TTL:
+        return app_ctx.team_map
+    teams_result = await app_ctx.supabase.table("teams").select("team_id, name").execute()
+    app_ctx.team_map = {team['team_id']: team['name'] for team in teams_result.data}
+    app_ctx.team_map_loaded_at = now
+    return app_ctx.team_map
 
 
 # --- MCP Server and Tool Definitions ---
@@ -174,20 +250,17 @@ T_AppContext = Context[ServerSession, AppContext]
 @app.tool()
 async def list_teams(ctx: T_AppContext) -> List[TeamBase]:
     """Lists all teams in the Fantasy Premier League."""
-    supabase = ctx.request_context.lifespan_context.supabase
-    
-    result = supabase.table("teams").select("*").execute()
-    return [TeamBase.model_validate(t) for t in result.data]
+    team_map = await _get_team_map(ctx.request_context.lifespan_context)
+    return [TeamBase(team_id=team_id, name=name) for team_id, name in team_map.items()]
 
 @app.tool()
 async def get_team(ctx: T_AppContext, team_id: int) -> Union[TeamBase, Content]:
     """Gets a specific team by its ID."""
-    supabase = ctx.request_context.lifespan_context.supabase
-    
-    result = supabase.table("teams").select("*").eq("team_id", team_id).execute()
-    if not result.data:
+    team_map = await _get_team_map(ctx.request_context.lifespan_context)
+    name = team_map.get(team_id)
+    if name is None:
         return Content(text=f"Team with id {team_id} not found")
-    return TeamBase.model_validate(result.data[0])
+    return TeamBase(team_id=team_id, name=name)
 
 @app.tool()
 async def list_players(ctx: T_AppContext, name: Optional[str] = None, min_cost: Optional[float] = None, max_cost: Optional[float] = None, available: Optional[bool] = None) -> List[PlayerBase]:
@@ -198,12 +271,12 @@ async def list_players(ctx: T_AppContext, name: Optional[str] = None, min_cost:
     """
     supabase = ctx.request_context.lifespan_context.supabase
     
-    query = supabase.table("players").select("*")
+    query = supabase.table("players").select(_PLAYER_COLUMNS)
     
     # 按名称筛选
     if name:
         # add or for name
-        query = query.or_(f"web_name.ilike.{name},first_name.ilike.{name},second_name.ilike.{name}")
+        query = query.or_(f"web_name.ilike.%{name}%,first_name.ilike.%{name}%,second_name.ilike.%{name}%")
     
     # 按身价范围筛选
     if min_cost is not None:
@@ -223,15 +296,15 @@ async def list_players(ctx: T_AppContext, name: Optional[str] = None, min_cost:
             # 如果筛选不可用球员，则选择chance_of_playing_next_round不为100且不为NULL的球员
             query = query.neq("chance_of_playing_next_round", 100).not_.is_("chance_of_playing_next_round", "null")
     
-    result = query.execute()
-    return [PlayerBase.model_validate(p) for p in result.data]
+    result = await query.execute()
+    return _PLAYER_LIST.validate_python(result.data)
 
 @app.tool()
 async def get_player(ctx: T_AppContext, player_id: int) -> Union[PlayerBase, Content]:
     """Gets a specific player by their ID."""
     supabase = ctx.request_context.lifespan_context.supabase
     
-    result = supabase.table("players").select("*").eq("player_id", player_id).execute()
+    result = await supabase.table("players").select(_PLAYER_COLUMNS).eq("player_id", player_id).execute()
     if not result.data:
         return Content(text=f"Player with id {player_id} not found")
     return PlayerBase.model_validate(result.data[0])
@@ -241,14 +314,14 @@ async def get_player_predictions(ctx: T_AppContext, player_id: int, gameweek: Op
     """Gets future gameweek predictions for a specific player. If gameweek is provided, returns only that gameweek's prediction."""
     supabase = ctx.request_context.lifespan_context.supabase
     
-    query = supabase.table("predictions").select("*, opponent_team:teams(name)").eq("player_id", player_id)
+    query = supabase.table("predictions_with_team").select("player_id, gw, predicted_pts, opponent_team:opponent_team_name, is_home, difficulty").eq("player_id", player_id)
     
     # 如果指定了轮次，则只查询该轮次的预测
     if gameweek is not None:
         query = query.eq("gw", gameweek)
     
     # 按轮次排序
-    result = query.order("gw").execute()
+    result = await query.order("gw").execute()
     
     if not result.data:
         if gameweek is not None:
@@ -256,22 +329,12 @@ async def get_player_predictions(ctx: T_AppContext, player_id: int, gameweek: Op
         else:
             return Content(text=f"Predictions not found for player with id {player_id}")
     
-    # 构建Pydantic模型列表作为返回结果
-    predictions = []
+    # 补齐缺失的对手名后整批校验为Pydantic模型
     for p in result.data:
-        opponent_team_name = p.get('opponent_team', {}).get('name', 'N/A') if isinstance(p.get('opponent_team'), dict) else 'N/A'
-        predictions.append(
-            PredictionBase(
-                player_id=player_id,
-                gw=p['gw'],
-                predicted_pts=p['predicted_pts'],
-                opponent_team=opponent_team_name,
-                is_home=p['is_home'],
-                difficulty=p['difficulty']
-            )
-        )
+        if p['opponent_team'] is None:
+            p['opponent_team'] = 'N/A'
     
-    return predictions
+    return _PREDICTION_LIST.validate_python(result.data)
 
 
 
@@ -281,33 +344,22 @@ async def get_player_history(ctx: T_AppContext, player_id: int, gameweek: Option
     """Gets the past gameweek performance history for a specific player."""
     supabase = ctx.request_context.lifespan_context.supabase
     
-    query = supabase.table("player_history").select("*, opponent_team:teams(name)").eq("player_id", player_id).order("round")
+    query = supabase.table("player_history").select(
+        "player_id, round, was_home, total_points, minutes, goals_scored, assists, clean_sheets, bonus, opponent_team:teams(name)"
+    ).eq("player_id", player_id).order("round")
     if gameweek is not None:
         query = query.eq("round", gameweek)
-    result = query.execute()
+    result = await query.execute()
     
     if not result.data:
         return Content(text=f"History not found for player with id {player_id}")
     
-    history = []
+    # Flatten the embedded opponent name, then validate all rows in one call
     for h in result.data:
-        opponent_team_name = h.get('opponent_team', {}).get('name', 'N/A') if isinstance(h.get('opponent_team'), dict) else 'N/A'
-        history.append(
-            PlayerHistoryBase(
-                player_id=player_id,
-                round=h['round'],
-                opponent_team=opponent_team_name,
-                was_home=h['was_home'],
-                total_points=h['total_points'],
-                minutes=h['minutes'],
-                goals_scored=h['goals_scored'],
-                assists=h['assists'],
-                clean_sheets=h['clean_sheets'],
-                bonus=h['bonus'],
-            )
-        )
+        opponent_team = h['opponent_team']
+        h['opponent_team'] = opponent_team.get('name', 'N/A') if isinstance(opponent_team, dict) else 'N/A'
     
-    return history
+    return _HISTORY_LIST.validate_python(result.data)
 
 
 @app.tool()
@@ -325,58 +377,27 @@ async def get_fixtures(ctx: T_AppContext, team_id: Optional[int] = None, gamewee
     supabase = ctx.request_context.lifespan_context.supabase
     
     try:
-        # 从预测表中获取当前轮次
-
-        
-        # 获取所有球队
-        teams_result = supabase.table("teams").select("team_id, name").execute()
-        team_map = {team['team_id']: team['name'] for team in teams_result.data}
-        
-        # 构建基础查询 - 获取每个轮次中每个球队的一个预测记录
-        query = supabase.table("predictions").select("gw, player:players(team_id), opponent_team_id, is_home, difficulty").gte("gw", gameweek)
+        team_map = await _get_team_map(ctx.request_context.lifespan_context)
+        # team_fixtures 视图已在数据库中按球队和轮次去重，只返回需要的对阵行
+        query = supabase.table("team_fixtures").select("team_id, gw, opponent_team_id, is_home, difficulty").gte("gw", gameweek)
         
         # 如果指定了球队ID，则只查询该球队的对阵
         if team_id:
-            query = query.eq("player.team_id", team_id)
+            query = query.eq("team_id", team_id)
         
-        result = query.execute()
-        print(result.data)
-        # 使用字典来确保每个球队和轮次组合只有一条记录
-        fixtures_dict = {}
-        for item in result.data:
-            player_data = item.get('player', {})
-            if isinstance(player_data, list) and player_data:
-                player_data = player_data[0]
-            
-            team_id_val = player_data.get('team_id') if isinstance(player_data, dict) else None
-            if not team_id_val:
-                continue
-            
-            key = (team_id_val, item['gw'])
-            if key not in fixtures_dict:
-                fixtures_dict[key] = {
-                    'gw': item['gw'],
-                    'team_id': team_id_val,
-                    'opponent_team_id': item['opponent_team_id'],
-                    'is_home': item['is_home'],
-                    'difficulty': item['difficulty']
-                }
+        result = await query.execute()
         
         # 构建结果
-        fixtures_list = []
-        for fixture_data in fixtures_dict.values():
-            team_name = team_map.get(fixture_data['team_id'], "未知")
-            opponent_name = team_map.get(fixture_data['opponent_team_id'], "未知")
-            
-            fixtures_list.append(
-                FixtureInfo(
-                    gameweek=fixture_data['gw'],
-                    team_name=team_name,
-                    opponent_name=opponent_name,
-                    is_home=fixture_data['is_home'],
-                    difficulty=fixture_data['difficulty']
-                )
+        fixtures_list = [
+            FixtureInfo(
+                gameweek=item['gw'],
+                team_name=team_map.get(item['team_id'], "未知"),
+                opponent_name=team_map.get(item['opponent_team_id'], "未知"),
+                is_home=item['is_home'],
+                difficulty=item['difficulty']
             )
+            for item in result.data
+        ]
         
         # 按轮次和球队名称排序
         fixtures_list.sort(key=lambda x: (x.gameweek, x.team_name))
@@ -398,21 +419,23 @@ async def get_my_team(ctx: T_AppContext) -> MyTeam | Content:
         return Content(text="FPL client not authenticated. Check server logs.")
 
     try:
-        user = await fpl_client.get_user()
+        fpl_cache = ctx.request_context.lifespan_context.fpl_cache
+        user = await _cached_fpl_call(fpl_cache, "user", fpl_client.get_user)
         gameweek = user.current_event
         
-        # Correctly fetch the team picks and transfer status
-        picks = await user.get_team()
-        transfers_status = await user.get_transfers_status()
-        # Explicitly fetch chips status
-        user_chips = await user.get_chips()
+        # Fetch team picks, transfer status and chips concurrently; they are independent
+        picks, transfers_status, user_chips = await asyncio.gather(
+            user.get_team(),
+            _cached_fpl_call(fpl_cache, "transfers_status", user.get_transfers_status),
+            _cached_fpl_call(fpl_cache, "chips", user.get_chips),
+        )
 
         team_players = []
         player_ids = [p['element'] for p in picks]
         
         # Fetch player details from Supabase
         supabase = ctx.request_context.lifespan_context.supabase
-        result = supabase.table("players").select("*").in_("player_id", player_ids).execute()
+        result = await supabase.table("players").select("player_id, now_cost, element_type, web_name").in_("player_id", player_ids).execute()
         players_map = {p['player_id']: p for p in result.data}
 
         total_cost = 0
@@ -476,21 +499,34 @@ async def get_team_fixtures(ctx: T_AppContext, team_name: str, gameweek: Optiona
     supabase = ctx.request_context.lifespan_context.supabase
     
     try:
-        # 查找匹配的球队
-        result = supabase.table("teams").select("*").ilike("name", f"%{team_name}%").execute()
-        if not result.data:
+        team_map = await _get_team_map(ctx.request_context.lifespan_context)
+        # 在缓存的球队表中查找匹配的球队（不区分大小写的部分匹配）
+        needle = team_name.lower()
+        team_id = next((tid for tid, name in team_map.items() if needle in name.lower()), None)
+        if team_id is None:
             return Content(text=f"未找到名称包含 '{team_name}' 的球队。")
-        team = result.data[0]
-        team_id = team['team_id']
         
-        # 使用get_fixtures函数获取该球队的对阵信息
-        fixtures = await get_fixtures(ctx, team_id, gameweek)
-        if isinstance(fixtures, Content):
-            return fixtures
-            
-        # 只返回该球队的对阵信息
-
-        return fixtures
+        # 直接查询该球队的对阵，按轮次排序
+        result = await (
+            supabase.table("team_fixtures")
+            .select("gw, opponent_team_id, is_home, difficulty")
+            .eq("team_id", team_id)
+            .gte("gw", gameweek)
+            .order("gw")
+            .execute()
+        )
+        
+        team_name = team_map[team_id]
+        return [
+            FixtureInfo(
+                gameweek=item['gw'],
+                team_name=team_name,
+                opponent_name=team_map.get(item['opponent_team_id'], "未知"),
+                is_home=item['is_home'],
+                difficulty=item['difficulty']
+            )
+            for item in result.data
+        ]
     except Exception as e:
         return Content(text=f"获取球队对阵信息时发生错误: {e}")
 
@@ -1,129 +1,330 @@
 #!/usr/bin/env python3
 """
-Migration script to transfer data from SQLite to Supabase using supabase-py
+Migration script to transfer data from SQLite to Supabase through its REST (PostgREST) API
 """
 import sqlite3
+import hashlib
+import logging
 import os
+import random
+import time
+import httpx
+import orjson
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
 from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Tuple
+from urllib.parse import quote, urlsplit
 from dotenv import load_dotenv
-from supabase import create_client
 
 load_dotenv()
 
+logger = logging.getLogger("migrate")
+
+# Log progress once every this many batches rather than after each one
+PROGRESS_EVERY = 10
+
+# Transient REST failures (rate limiting, gateway/server errors) are retried
+# with jittered exponential backoff before a batch is reported as failed
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_ATTEMPTS = 6
+
+@dataclass
+class TableCfg:
+    """Per-table migration settings, built once in main"""
+    columns: Tuple[str, ...]
+    # Index of the first migrated SQLite column; 1 skips the source id column
+    slice_start: int = 1
+    # Unique key columns (also the upsert on_conflict target); only the
+    # last-written row for each key is migrated
+    dedup_keys: Optional[Tuple[str, ...]] = None
+    # Upsert conflict target: the dedup keys, otherwise the primary key (first column)
+    conflict_keys: Tuple[str, ...] = field(init=False)
+    on_conflict: str = field(init=False)
+    column_list: str = field(init=False)
+    has_kickoff_time: bool = field(init=False)
+    
+    def __post_init__(self):
+        self.conflict_keys = self.dedup_keys or self.columns[:1]
+        self.on_conflict = ",".join(self.conflict_keys)
+        self.column_list = ",".join(self.columns)
+        self.has_kickoff_time = 'kickoff_time' in self.columns
+
 def get_sqlite_connection():
     """Get SQLite database connection"""
     db_path = os.environ.get('DB_PATH', '/Users/d5/Documents/code/own/FPL-GPT/db/fpl.db')
-    return sqlite3.connect(db_path)
+    # Open read-only: no write locks or journal on the source database, and a
+    # wrong DB_PATH fails loudly instead of creating an empty file
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True)
+    # The migration only reads: give SQLite a bigger page cache, memory-mapped
+    # I/O and in-memory temp storage for sorts instead of the defaults
+    conn.execute("PRAGMA cache_size=-64000")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
 
-def get_supabase_client():
-    """Get Supabase client"""
+def get_pg_connection():
+    """Get a direct Postgres connection for COPY-based loading, or None when SUPABASE_DB_URL is not set"""
+    db_url = os.environ.get('SUPABASE_DB_URL')
+    if not db_url:
+        return None
+    
+    try:
+        import psycopg
+    except ImportError:
+        raise ImportError("psycopg is required for SUPABASE_DB_URL. Install it with: pip install 'psycopg[binary]'")
+    # One connection is enough: tables load one at a time, each in a single
+    # transaction. Server-side prepared statements are disabled so the URL
+    # may also point at Supabase's transaction-mode pooler
+    return psycopg.connect(db_url, prepare_threshold=None)
+
+def get_rest_client(max_workers=8):
+    """Get a keep-alive HTTP/2 client for the Supabase REST API, shared by all upsert workers"""
     supabase_url = os.environ.get('SUPABASE_URL')
     supabase_key = os.environ.get('SUPABASE_KEY')
     
     if not supabase_url or not supabase_key:
         raise ValueError("SUPABASE_URL and SUPABASE_KEY environment variables are required")
     
-    try:
-        return create_client(supabase_url, supabase_key)
-    except ImportError:
-        raise ImportError("supabase is required. Install it with: pip install supabase")
+    return httpx.Client(
+        base_url=f"{supabase_url.rstrip('/')}/rest/v1",
+        headers={
+            "apikey": supabase_key,
+            "Authorization": f"Bearer {supabase_key}",
+            "Content-Type": "application/json",
+        },
+        http2=True,
+        timeout=httpx.Timeout(60.0),
+        limits=httpx.Limits(max_connections=max_workers, max_keepalive_connections=max_workers),
+        follow_redirects=True,
+    )
 
-def strict_deduplicate(batch_data, key_columns):
-    """严格去重，确保同一批次内没有重复"""
-    seen = set()
-    unique_data = []
-    duplicates_count = 0
-    
-    for item in batch_data:
-        key = tuple(item[column] for column in key_columns)
-        if key not in seen:
-            seen.add(key)
-            unique_data.append(item)
-        else:
-            duplicates_count += 1
-            print(f"移除重复: {key}")
-    
-    if duplicates_count > 0:
-        print(f"共移除 {duplicates_count} 条重复记录")
+@lru_cache(maxsize=4096)
+def normalize_kickoff_time(value):
+    """Normalize a kickoff_time string to ISO 8601 (cached: every row of a fixture shares it)"""
+    # Already canonical 'YYYY-MM-DDTHH:MM:SS[+HH:MM]': skip the parse/format round trip
+    if value[10:11] == 'T' and (len(value) == 19 or (len(value) == 25 and value[19] in '+-')):
+        return value
+    return datetime.fromisoformat(value).isoformat()
+
+def source_query(sqlite_conn, table_name, cfg):
+    """SQLite query that streams the rows to migrate for a table
     
-    return unique_data
+    Source columns are matched to cfg.columns by position, starting at
+    cfg.slice_start; only those columns are selected.
+    """
+    source_columns = [row[1] for row in sqlite_conn.execute(f"PRAGMA table_info({table_name})")]
+    selected = source_columns[cfg.slice_start:cfg.slice_start + len(cfg.columns)]
+    select_list = ", ".join(f'"{c}"' for c in selected)
+    if cfg.dedup_keys:
+        # Deduplicate in SQLite: keep the highest rowid per key, matching the
+        # later-row-wins order the upserts had. Keys are target column names,
+        # mapped to their source columns by position like the select list
+        keys = ", ".join(f'"{selected[cfg.columns.index(k)]}"' for k in cfg.dedup_keys)
+        return (
+            f"SELECT {select_list} FROM {table_name} "
+            f"WHERE rowid IN (SELECT MAX(rowid) FROM {table_name} GROUP BY {keys}) ORDER BY rowid"
+        )
+    return f"SELECT {select_list} FROM {table_name}"
+
+def row_fingerprint(row):
+    """8-byte digest of a row's migrated values (columns are always in the same order)"""
+    return hashlib.blake2b(orjson.dumps(row), digest_size=8).digest()
+
+def destination_state_dir(base_dir, supabase_url):
+    """Per-destination subdirectory of MIGRATE_STATE_DIR, so state recorded
+    against one Supabase project is never trusted for another"""
+    return os.path.join(base_dir, urlsplit(supabase_url).netloc)
+
+def load_fingerprints(state_dir, table_name):
+    """Fingerprints of the rows a previous run upserted for a table"""
+    try:
+        with open(os.path.join(state_dir, f"{table_name}.fp"), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return set()
+    return {data[i:i + 8] for i in range(0, len(data), 8)}
+
+def save_fingerprints(state_dir, table_name, fingerprints):
+    """Persist the fingerprints of every row now known to be in Supabase"""
+    os.makedirs(state_dir, exist_ok=True)
+    with open(os.path.join(state_dir, f"{table_name}.fp"), "wb") as f:
+        f.write(b"".join(fingerprints))
+
+def count_rows(rest_client, table_name):
+    """Exact row count of a Supabase table, read from the Content-Range header"""
+    response = rest_client.head(f"/{table_name}", params={"select": "*"}, headers={"Prefer": "count=exact"})
+    response.raise_for_status()
+    return int(response.headers["Content-Range"].rsplit("/", 1)[1])
+
+def upsert_batch(rest_client, table_name, cfg, rows):
+    """Upsert one batch of rows into a Supabase table"""
+    params = {"columns": cfg.column_list, "on_conflict": cfg.on_conflict}
+    # Serialize with orjson instead of the stdlib json supabase-py uses, and
+    # ask PostgREST not to echo the upserted rows back (return=minimal)
+    body = orjson.dumps(rows)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            response = rest_client.post(
+                f"/{table_name}",
+                params=params,
+                content=body,
+                headers={"Prefer": "resolution=merge-duplicates,return=minimal"},
+            )
+            response.raise_for_status()
+            return
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            retryable = isinstance(e, httpx.TransportError) or e.response.status_code in RETRY_STATUSES
+            if not retryable or attempt == MAX_ATTEMPTS:
+                raise
+            # Upserts are idempotent, so resending the same batch is safe
+            time.sleep(min(30, 0.5 * 2 ** attempt) + random.random() * 0.5)
 
-def migrate_table(sqlite_conn, supabase, table_name, columns, batch_size=1000):
-    """Migrate data from SQLite to Supabase for a specific table"""
-    print(f"Migrating {table_name} table...")
+def migrate_table(sqlite_conn, rest_client, table_name, cfg, batch_size=5000, max_workers=8, state_dir=None):
+    """Migrate data from SQLite to Supabase for a specific table
+    
+    With state_dir set, rows whose values are unchanged since a previous run
+    (same fingerprint) are skipped instead of being upserted again.
+    """
+    logger.info("Migrating %s table...", table_name)
     
     sqlite_cursor = sqlite_conn.cursor()
     
-    # Get total count for progress tracking
-    sqlite_cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-    total_rows = sqlite_cursor.fetchone()[0]
-    print(f"  Total rows: {total_rows}")
+    # The total is only for progress output: MAX(rowid) is a single b-tree
+    # lookup, where COUNT(*) (or a GROUP BY count for deduped tables) would be
+    # another full scan before the real one
+    sqlite_cursor.execute(f"SELECT MAX(rowid) FROM {table_name}")
+    estimated_rows = sqlite_cursor.fetchone()[0] or 0
+    logger.info("  Rows (upper bound): %d", estimated_rows)
     
-    if total_rows == 0:
-        print(f"  No data to migrate for {table_name}")
+    if estimated_rows == 0:
+        logger.info("  No data to migrate for %s", table_name)
         return
     
-    # Fetch data in batches
-    offset = 0
+    # Stream rows with a single query instead of LIMIT/OFFSET, which rescans
+    # and skips every earlier row on each batch
+    sqlite_cursor.arraysize = batch_size
+    sqlite_cursor.execute(source_query(sqlite_conn, table_name, cfg))
+    columns = cfg.columns
+    read_count = 0
     migrated_count = 0
+    skipped_count = 0
+    batches_done = 0
+    # Exact fingerprint sets rather than a Bloom filter: a false positive would
+    # silently skip a changed row, and a season of rows is only a few hundred KB
+    previous_fps = load_fingerprints(state_dir, table_name) if state_dir else set()
+    # Every recorded row should still be there; fewer rows means the table was
+    # reset since the state was written, so nothing recorded can be trusted
+    if previous_fps and count_rows(rest_client, table_name) < len(previous_fps):
+        logger.warning("  %s has fewer rows than the saved state records; re-upserting every row", table_name)
+        previous_fps = set()
+    done_fps = set()
     
-    while offset < total_rows:
-        sqlite_cursor.execute(f"SELECT * FROM {table_name} LIMIT ? OFFSET ?", (batch_size, offset))
-        rows = sqlite_cursor.fetchall()
-        # breakpoint()
-        if not rows:
-            break
-        
-        # Convert rows to dictionaries for Supabase
-        data_to_insert = []
-        for row in rows:
-            row_dict = {}
-            if table_name != "players" and table_name != "teams":
-                # remove id column
-                row = row[1:]
-            else:
-                # rename id to player_id or team_id
-                columns[0] = 'player_id' if table_name == 'players' else 'team_id'
-            for i, column in enumerate(columns):
-                # Handle data type conversions if needed
-                value = row[i]
-                if column == 'kickoff_time' and value is not None:
-                    # Handle different data types for kickoff_time
-                    # Skip conversion for invalid values like "0"
-                    value = datetime.fromisoformat(value).isoformat()
-
-                row_dict[column] = value
-            data_to_insert.append(row_dict)
-        if table_name == "player_history":
-            data_to_insert = strict_deduplicate(data_to_insert, ['player_id', 'round'])
-        elif table_name == "predictions":
-            data_to_insert = strict_deduplicate(data_to_insert, ['player_id', 'gw'])
-        
-        try:
-            # Use upsert for tables with primary keys, insert for others
-            if table_name == "player_history":
-                result =supabase.table(table_name).upsert(data_to_insert, on_conflict="player_id,round").execute()
-            elif table_name == "predictions":
-                result = supabase.table(table_name).upsert(data_to_insert, on_conflict="player_id,gw").execute()
-            else:
-                result = supabase.table(table_name).upsert(data_to_insert).execute()
+    def collect(done):
+        nonlocal migrated_count, batches_done
+        for future in done:
+            start, count, batch_fps = in_flight.pop(future)
+            try:
+                future.result()
+                migrated_count += len(batch_fps) if batch_fps is not None else count
+                if batch_fps is not None:
+                    done_fps.update(batch_fps)
+                batches_done += 1
+                if batches_done % PROGRESS_EVERY == 0:
+                    logger.info("  Migrated %d/~%d rows", migrated_count, estimated_rows)
+            except Exception as e:
+                logger.error("  Error migrating batch (rows %d-%d): %s", start + 1, start + count, e)
+    
+    # Keys are unique across batches (deduplicated in SQL), so batches can be
+    # upserted concurrently; the number in flight is capped to bound memory
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            rows = sqlite_cursor.fetchmany()
+            if not rows:
+                break
             
-            migrated_count += len(rows)
-            print(f"  Migrated {migrated_count}/{total_rows} rows")
-        except Exception as e:
-            print(f"  Error migrating batch: {e}")
-            # Debug: print the first row's kickoff_time value and type
+            # Convert rows to dictionaries for Supabase, then fix up kickoff_time
+            # in a separate pass so the common path is a single comprehension
+            data_to_insert = [dict(zip(columns, row)) for row in rows]
+            if cfg.has_kickoff_time:
+                for row_dict in data_to_insert:
+                    if row_dict['kickoff_time'] is not None:
+                        row_dict['kickoff_time'] = normalize_kickoff_time(row_dict['kickoff_time'])
             
-            print(f"    Error in row {offset + i + 1}: {e}")
+            batch_fps = None
+            if state_dir:
+                fps = [row_fingerprint(row_dict) for row_dict in data_to_insert]
+                changed = [i for i, fp in enumerate(fps) if fp not in previous_fps]
+                skipped_count += len(fps) - len(changed)
+                done_fps.update(fp for fp in fps if fp in previous_fps)
+                data_to_insert = [data_to_insert[i] for i in changed]
+                batch_fps = [fps[i] for i in changed]
             
-            # 打印前几个字段的值来帮助调试
-            # breakpoint()
-            # sample_data = list(row_data.values())
-            # print(f"    Sample data: {sample_data}")
+            if data_to_insert:
+                if len(in_flight) >= 2 * max_workers:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                future = pool.submit(upsert_batch, rest_client, table_name, cfg, data_to_insert)
+                in_flight[future] = (read_count, len(rows), batch_fps)
+            read_count += len(rows)
         
-        offset += batch_size
+        collect(list(in_flight))
+    
+    if state_dir:
+        save_fingerprints(state_dir, table_name, done_fps)
+        logger.info("  Skipped %d unchanged rows", skipped_count)
+    logger.info("  Completed: %d/%d rows migrated", migrated_count, read_count)
+
+def copy_table(sqlite_conn, pg_conn, table_name, cfg, batch_size=5000):
+    """Bulk-load a table over a direct Postgres connection
+    
+    Rows are streamed with COPY into a temp table, then merged into the real
+    table with a single INSERT ... ON CONFLICT DO UPDATE.
+    """
+    logger.info("Copying %s table...", table_name)
     
-    print(f"  Completed: {migrated_count}/{total_rows} rows migrated")
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.arraysize = batch_size
+    sqlite_cursor.execute(source_query(sqlite_conn, table_name, cfg))
+    
+    columns = ", ".join(cfg.columns)
+    staging = f"tmp_{table_name}"
+    value_columns = [c for c in cfg.columns if c not in cfg.conflict_keys]
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in value_columns)
+    # Only touch rows whose values actually changed, so re-runs don't rewrite
+    # (and WAL-log and re-index) rows that already match
+    changed = (
+        f"({', '.join(f'{table_name}.{c}' for c in value_columns)}) "
+        f"IS DISTINCT FROM ({', '.join(f'EXCLUDED.{c}' for c in value_columns)})"
+    )
+    kickoff_idx = cfg.columns.index('kickoff_time') if cfg.has_kickoff_time else None
+    copied_count = 0
+    batches_done = 0
+    
+    with pg_conn.transaction(), pg_conn.cursor() as cur:
+        cur.execute(f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {columns} FROM {table_name} WITH NO DATA")
+        with cur.copy(f"COPY {staging} ({columns}) FROM STDIN") as copy:
+            while True:
+                rows = sqlite_cursor.fetchmany()
+                if not rows:
+                    break
+                for row in rows:
+                    if kickoff_idx is not None and row[kickoff_idx] is not None:
+                        row = list(row)
+                        row[kickoff_idx] = normalize_kickoff_time(row[kickoff_idx])
+                    copy.write_row(row)
+                copied_count += len(rows)
+                batches_done += 1
+                if batches_done % PROGRESS_EVERY == 0:
+                    logger.info("  Copied %d rows", copied_count)
+        
+        cur.execute(
+            f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {staging} "
+            f"ON CONFLICT ({cfg.on_conflict}) DO UPDATE SET {updates} WHERE {changed}"
+        )
+        logger.info("  Completed: %d/%d rows inserted or changed", cur.rowcount, copied_count)
 
 def main():
     """Main migration function"""
@@ -132,38 +333,56 @@ def main():
     
     try:
         sqlite_conn = get_sqlite_connection()
-        supabase = get_supabase_client()
+        # With SUPABASE_DB_URL set, load through COPY on a direct Postgres
+        # connection; otherwise upsert through the REST API
+        pg_conn = get_pg_connection()
         
-        # Debug: Check the actual Supabase table structure
-        try:
-            result = supabase.table("player_history").select("kickoff_time").limit(1).execute()
-            print("Supabase player_history table exists and can be queried")
-        except Exception as e:
-            print(f"Warning: Could not query player_history table: {e}")
-            print("Make sure the table exists with the correct schema")
-            print("Run the supabase_schema.sql file to create the tables")
-            return
+        if pg_conn is None:
+            rest_client = get_rest_client()
+            
+            # Debug: Check the actual Supabase table structure
+            try:
+                rest_client.get("/player_history", params={"select": "kickoff_time", "limit": 1}).raise_for_status()
+                print("Supabase player_history table exists and can be queried")
+            except Exception as e:
+                print(f"Warning: Could not query player_history table: {e}")
+                print("Make sure the table exists with the correct schema")
+                print("Run the supabase_schema.sql file to create the tables")
+                return
         
-        # Define table schemas for migration
+        # Define table schemas for migration; players/teams keep the SQLite id
+        # column as their player_id/team_id
         tables = {
-            'teams': [
-                'team_id', 'name', 'short_name'
-            ],
-            'players': [
-                'player_id', 'web_name', 'first_name', 'second_name', 'team_id', 'team_code', 'element_type', 'now_cost', 'total_points', 'minutes', 'goals_scored', 'assists', 'clean_sheets', 'goals_conceded', 'own_goals', 'penalties_saved', 'penalties_missed', 'yellow_cards', 'red_cards', 'saves', 'bonus', 'bps', 'influence', 'creativity', 'threat', 'ict_index', 'event_points', 'chance_of_playing_next_round', 'chance_of_playing_this_round', 'status', 'news'
-            ],
-            
-            'player_history': [
-                'player_id', 'fixture_id', 'opponent_team_id', 'total_points', 'was_home', 'kickoff_time', 'round', 'minutes', 'goals_scored', 'assists', 'clean_sheets', 'goals_conceded', 'own_goals', 'penalties_saved', 'penalties_missed', 'yellow_cards', 'red_cards', 'saves', 'bonus', 'bps', 'influence', 'creativity', 'threat', 'ict_index'
-            ],
-            'predictions': [
-                'player_id', 'gw', 'predicted_pts', 'opponent_team_id', 'is_home', 'difficulty'
-            ]
+            'teams': TableCfg(
+                columns=('team_id', 'name', 'short_name'),
+                slice_start=0,
+            ),
+            'players': TableCfg(
+                columns=('player_id', 'web_name', 'first_name', 'second_name', 'team_id', 'team_code', 'element_type', 'now_cost', 'total_points', 'minutes', 'goals_scored', 'assists', 'clean_sheets', 'goals_conceded', 'own_goals', 'penalties_saved', 'penalties_missed', 'yellow_cards', 'red_cards', 'saves', 'bonus', 'bps', 'influence', 'creativity', 'threat', 'ict_index', 'event_points', 'chance_of_playing_next_round', 'chance_of_playing_this_round', 'status', 'news'),
+                slice_start=0,
+            ),
+            'player_history': TableCfg(
+                columns=('player_id', 'fixture_id', 'opponent_team_id', 'total_points', 'was_home', 'kickoff_time', 'round', 'minutes', 'goals_scored', 'assists', 'clean_sheets', 'goals_conceded', 'own_goals', 'penalties_saved', 'penalties_missed', 'yellow_cards', 'red_cards', 'saves', 'bonus', 'bps', 'influence', 'creativity', 'threat', 'ict_index'),
+                dedup_keys=('player_id', 'round'),
+            ),
+            'predictions': TableCfg(
+                columns=('player_id', 'gw', 'predicted_pts', 'opponent_team_id', 'is_home', 'difficulty'),
+                dedup_keys=('player_id', 'gw'),
+            ),
         }
         
+        # Fingerprint state only applies to the REST path (get_rest_client has
+        # already checked SUPABASE_URL is set)
+        state_dir = os.environ.get('MIGRATE_STATE_DIR')
+        if state_dir and pg_conn is None:
+            state_dir = destination_state_dir(state_dir, os.environ['SUPABASE_URL'])
+        
         # Migrate each table
-        for table_name, columns in tables.items():
-            migrate_table(sqlite_conn, supabase, table_name, columns)
+        for table_name, cfg in tables.items():
+            if pg_conn is not None:
+                copy_table(sqlite_conn, pg_conn, table_name, cfg)
+            else:
+                migrate_table(sqlite_conn, rest_client, table_name, cfg, state_dir=state_dir)
         
         print("Migration completed successfully!")
         print("\nNext steps:")
@@ -176,11 +395,28 @@ def main():
         print("\nTroubleshooting tips:")
         print("1. Make sure Supabase tables are created (run supabase_schema.sql)")
         print("2. Check your SUPABASE_URL and SUPABASE_KEY environment variables")
-        print("3. Install supabase: pip install supabase")
+        print("3. Install dependencies: pip install 'httpx[http2]' orjson python-dotenv")
+        print("   (plus 'psycopg[binary]' when loading through SUPABASE_DB_URL)")
         raise
     finally:
         if 'sqlite_conn' in locals():
             sqlite_conn.close()
+        if 'rest_client' in locals():
+            rest_client.close()
+        if locals().get('pg_conn') is not None:
+            pg_conn.close()
+
+def log_level_from_env():
+    """LOG_LEVEL as a logging level, falling back to INFO for unknown names"""
+    name = (os.getenv('LOG_LEVEL') or 'INFO').strip().upper()
+    level = logging.getLevelNamesMapping().get(name)
+    if level is None:
+        print(f"Warning: unknown LOG_LEVEL {name!r}, using INFO")
+        return logging.INFO
+    return level
 
 if __name__ == "__main__":
+    logging.basicConfig(level=log_level_from_env(), format='%(message)s')
+    # httpx logs every request at INFO, which would drown out the batched progress lines
+    logging.getLogger("httpx").setLevel(logging.WARNING)
     main()
\ No newline at end of file
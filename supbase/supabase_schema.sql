@@ -14,7 +14,7 @@ CREATE TABLE IF NOT EXISTS players (
     web_name TEXT,
     first_name TEXT,
     second_name TEXT,
-    team_id INTEGER REFERENCES teams(id),
+    team_id INTEGER REFERENCES teams(team_id),
     team_code INTEGER,
     element_type INTEGER,  -- Position: 1: GK, 2: DEF, 3: MID, 4: FWD
     now_cost INTEGER,
@@ -91,7 +91,39 @@ CREATE TABLE IF NOT EXISTS predictions (
 CREATE INDEX IF NOT EXISTS idx_players_team_id ON players(team_id);
 CREATE INDEX IF NOT EXISTS idx_players_element_type ON players(element_type);
 CREATE INDEX IF NOT EXISTS idx_players_now_cost ON players(now_cost);
+-- Trigram indexes for the substring (ILIKE '%name%') player name search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_players_web_name_trgm ON players USING gin (web_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_players_first_name_trgm ON players USING gin (first_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_players_second_name_trgm ON players USING gin (second_name gin_trgm_ops);
 CREATE INDEX IF NOT EXISTS idx_player_history_player_id ON player_history(player_id);
 CREATE INDEX IF NOT EXISTS idx_player_history_round ON player_history(round);
+-- get_player_history filters by player and orders by round; unique because the
+-- loader merges double gameweeks into one row and upserts on (player_id, round)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_player_history_player_round_unique ON player_history(player_id, round);
 CREATE INDEX IF NOT EXISTS idx_predictions_player_id ON predictions(player_id);
-CREATE INDEX IF NOT EXISTS idx_predictions_gw ON predictions(gw);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_predictions_gw ON predictions(gw);
+
+-- Fixtures view: one row per team per gameweek, de-duplicated from predictions
+CREATE OR REPLACE VIEW team_fixtures AS
+SELECT DISTINCT
+    p.team_id,
+    pr.gw,
+    pr.opponent_team_id,
+    pr.is_home,
+    pr.difficulty
+FROM predictions pr
+JOIN players p ON p.player_id = pr.player_id;
+
+-- Predictions with the opponent's name resolved, so readers don't need an embedded join
+CREATE OR REPLACE VIEW predictions_with_team AS
+SELECT
+    pr.player_id,
+    pr.gw,
+    pr.predicted_pts,
+    pr.opponent_team_id,
+    t.name AS opponent_team_name,
+    pr.is_home,
+    pr.difficulty
+FROM predictions pr
+LEFT JOIN teams t ON t.team_id = pr.opponent_team_id;